@@ -0,0 +1,77 @@
+import glob
+import os
+import pickle
+
+import traci
+
+LATEST = "latest.pkl"
+RESULT = "result.pkl"
+
+
+def _write_atomic(path, obj):
+    # A crash while writing must never leave a truncated checkpoint behind
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        pickle.dump(obj, f)
+    os.replace(tmp, path)
+
+
+def _read(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        return pickle.load(f)
+
+
+class Checkpointer:
+    """Periodic SUMO state + controller state snapshots for one run.
+
+    save() writes the simulation state with saveState() and pickles the
+    controller state next to it; latest() returns the most recent pair and
+    restore() loads it into a freshly started SUMO.
+    """
+
+    def __init__(self, directory, interval=300, keep=2):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+        self.last_saved = None
+
+    def due(self, sim_time):
+        if self.last_saved is None:
+            self.last_saved = sim_time
+        return sim_time - self.last_saved >= self.interval
+
+    def save(self, sim_time, controller_state):
+        state_file = os.path.join(self.directory, f"sumo_state_{int(sim_time):06d}.xml.gz")
+        traci.simulation.saveState(state_file)
+        _write_atomic(os.path.join(self.directory, LATEST),
+                      {'time': sim_time, 'state_file': state_file, 'controller': controller_state})
+        self.last_saved = sim_time
+
+        for old in sorted(glob.glob(os.path.join(self.directory, "sumo_state_*.xml.gz")))[:-self.keep]:
+            os.remove(old)
+        print(f"Checkpoint saved at {sim_time}s")
+
+    def latest(self):
+        checkpoint = _read(os.path.join(self.directory, LATEST))
+        if checkpoint and os.path.exists(checkpoint['state_file']):
+            return checkpoint
+        return None
+
+    def restore(self):
+        # Returns the saved controller state, or None when starting fresh
+        checkpoint = self.latest()
+        if checkpoint is None:
+            return None
+        traci.simulation.loadState(checkpoint['state_file'])
+        self.last_saved = checkpoint['time']
+        print(f"Resumed from checkpoint at {checkpoint['time']}s")
+        return checkpoint['controller']
+
+    def save_result(self, result):
+        _write_atomic(os.path.join(self.directory, RESULT), result)
+
+    def load_result(self):
+        return _read(os.path.join(self.directory, RESULT))
@@ -0,0 +1,224 @@
+"""Single entry point for the Gjilan traffic experiments.
+
+Heavy dependencies (traci, sumolib, numpy, pandas, deap) are imported only
+inside the subcommand that needs them, so `python cli.py <cmd> --help` and
+short sweep jobs start without paying for unrelated imports.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+DEFAULT_CONFIG = "gjilaniData/gjilani.sumocfg"
+DEFAULT_NET = "gjilaniData/gjilani.net.xml"
+
+
+def print_metrics(metrics):
+    if metrics:
+        print("Simulation completed successfully. Performance metrics:")
+        for i, metric in enumerate(metrics):
+            print(f"Time {i*10}s: {metric}")
+    else:
+        print("Simulation failed or was interrupted")
+
+
+def trajectory_options(args):
+    return dict(trajectory_dir=args.trajectories, trajectory_period=args.trajectory_period,
+                trajectory_bbox=args.trajectory_bbox, trajectory_edges=args.trajectory_edges,
+                trajectory_fraction=args.trajectory_fraction)
+
+
+def cmd_baseline(args):
+    from main import run_simulation
+    print_metrics(run_simulation(args.config, optimized=False, sumo_args=args.sumo_args,
+                                 **trajectory_options(args)))
+
+
+def cmd_heuristic(args):
+    from main1 import run_simulation
+    print_metrics(run_simulation(args.config, optimized=True))
+
+
+def cmd_qlearn(args):
+    from main import run_simulation
+    print_metrics(run_simulation(args.config, optimized=True, sumo_args=args.sumo_args,
+                                 step_budget=args.step_budget, realtime=args.realtime, record_file=args.record,
+                                 detector_file=args.detectors,
+                                 analytics_client=args.analytics_client, port=args.port,
+                                 checkpoint_dir=args.checkpoint_dir, route_table=args.route_table,
+                                 **trajectory_options(args)))
+
+
+def cmd_ga(args):
+    try:
+        from congestion_optimizer import CongestionOptimizer
+    except ModuleNotFoundError as e:
+        if e.name != "congestion_optimizer":
+            raise
+        sys.exit("The GA optimizer (congestion_optimizer.py) is not part of this repository; "
+                 "add it next to cli.py to use the 'ga' command.")
+    optimizer = CongestionOptimizer(
+        config_file=args.config,
+        net_file=args.net,
+        route_file=args.routes,
+        output_dir=args.output_dir
+    )
+    print("Starting congestion optimization")
+    best_solution = optimizer.optimize()
+    print("\nBest solution found:")
+    print(best_solution)
+
+
+def cmd_realtime(args):
+    # Real-time control is the Q-learning loop paced to wall-clock with a per-tick budget
+    from main import run_simulation
+    print_metrics(run_simulation(args.config, optimized=True, realtime=True, step_budget=args.step_budget,
+                                 sumo_args=args.sumo_args))
+
+
+def cmd_compare(args):
+    from mainIm import run_separate_simulations
+    run_separate_simulations(args.config)
+
+
+def cmd_replay(args):
+    from recorder import replay_simulation
+    sumo_args = list(args.sumo_args)
+    if args.additional_files:
+        sumo_args += ["--additional-files", args.additional_files]
+    replay_simulation(args.config, args.log, sumo_args=sumo_args)
+
+
+def cmd_detectors(args):
+    from detectors import generate_detectors
+    generate_detectors(args.net, args.output, detector_length=args.length, freq=args.freq)
+
+
+def cmd_routes(args):
+    from routetable import precompute_route_table
+    precompute_route_table(args.net, args.trips, args.output, k=args.k, min_count=args.min_count,
+                           max_pairs=args.max_pairs)
+
+
+def cmd_startup_bench(args):
+    # Fresh interpreters, so every measurement includes the interpreter start
+    root = os.path.dirname(os.path.abspath(__file__))
+
+    def timed(code_args):
+        best, ok = None, True
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = subprocess.run([sys.executable] + code_args, cwd=root,
+                                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+            ok = ok and result.returncode == 0
+        return best, ok
+
+    def report(label, code_args):
+        elapsed, ok = timed(code_args)
+        print(f"{label:<36}{elapsed:8.1f} ms{'' if ok else '  (failed, dependency missing?)'}")
+
+    report("python -c pass", ["-c", "pass"])
+    report("cli.py --help (dispatcher only)", [os.path.join(root, "cli.py"), "--help"])
+    # What each subcommand actually imports before it starts working
+    for command, module in COMMAND_MODULES.items():
+        report(f"{command}: import {module}", ["-c", f"import {module}"])
+    for module in ["traci", "sumolib", "numpy", "pandas", "deap"]:
+        report(f"import {module}", ["-c", f"import {module}"])
+
+
+# Module imported by each subcommand's handler
+COMMAND_MODULES = {
+    "baseline": "main",
+    "heuristic": "main1",
+    "qlearn": "main",
+    "ga": "congestion_optimizer",
+    "realtime": "main",
+    "compare": "mainIm",
+    "replay": "recorder",
+    "detectors": "detectors",
+    "routes": "routetable",
+}
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Gjilan traffic simulation and optimization")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    def add(name, func, help_text):
+        sub = subparsers.add_parser(name, help=help_text)
+        sub.add_argument("--config", default=DEFAULT_CONFIG, help="SUMO configuration file")
+        sub.set_defaults(func=func)
+        return sub
+
+    def add_trajectory_args(sub):
+        sub.add_argument("--trajectories", default=None, help="directory for sampled trajectory chunks")
+        sub.add_argument("--trajectory-period", type=float, default=5, help="seconds between trajectory samples")
+        sub.add_argument("--trajectory-bbox", type=float, nargs=4, default=None,
+                         metavar=("XMIN", "YMIN", "XMAX", "YMAX"), help="only capture vehicles inside this box")
+        sub.add_argument("--trajectory-edges", nargs="+", default=None, help="only capture vehicles on these edges")
+        sub.add_argument("--trajectory-fraction", type=float, default=1.0,
+                         help="fraction of vehicles to follow (stable per vehicle)")
+
+    sub = add("baseline", cmd_baseline, "run without optimization")
+    add_trajectory_args(sub)
+    sub.add_argument("--sumo-args", nargs=argparse.REMAINDER, default=[], help="extra arguments passed to SUMO")
+
+    add("heuristic", cmd_heuristic, "run the threshold-based heuristic optimizers")
+
+    sub = add("qlearn", cmd_qlearn, "run the Q-learning traffic light controller")
+    sub.add_argument("--step-budget", type=float, default=None, help="wall-clock seconds per control tick")
+    sub.add_argument("--realtime", action="store_true", help="pace the simulation to wall-clock time")
+    sub.add_argument("--record", default=None, help="write an actuation log for replay")
+    sub.add_argument("--detectors", default=None, help="generated detector additional-file to read approaches from")
+    sub.add_argument("--analytics-client", action="store_true", help="collect metrics in a second TraCI client")
+    sub.add_argument("--port", type=int, default=None, help="TraCI port for the multi-client mode (default: a free port)")
+    sub.add_argument("--checkpoint-dir", default=None, help="checkpoint periodically and resume from this directory")
+    sub.add_argument("--route-table", default=None, help="precomputed route table directory for rerouting")
+    add_trajectory_args(sub)
+    sub.add_argument("--sumo-args", nargs=argparse.REMAINDER, default=[], help="extra arguments passed to SUMO")
+
+    sub = add("ga", cmd_ga, "run the genetic algorithm optimizer (needs congestion_optimizer.py)")
+    sub.add_argument("--net", default=DEFAULT_NET, help="SUMO network file")
+    sub.add_argument("--routes", default="gjilaniData/gjilani.rou.xml", help="SUMO route file")
+    sub.add_argument("--output-dir", default="congestion_results_400s")
+
+    sub = add("realtime", cmd_realtime, "run the Q-learning controller paced to wall-clock time")
+    sub.add_argument("--step-budget", type=float, default=1.0, help="wall-clock seconds per control tick")
+    sub.add_argument("--sumo-args", nargs=argparse.REMAINDER, default=[], help="extra arguments passed to SUMO")
+
+    add("compare", cmd_compare, "run original and optimized simulations back to back")
+
+    sub = add("replay", cmd_replay, "re-apply a recorded actuation log with the optimizers off")
+    sub.add_argument("--log", required=True, help="actuation log written by qlearn --record")
+    sub.add_argument("--additional-files", default=None, help="additional-files used in the live run (e.g. detectors)")
+    sub.add_argument("--sumo-args", nargs=argparse.REMAINDER, default=[], help="extra SUMO arguments used in the live run")
+
+    sub = subparsers.add_parser("detectors", help="generate junction approach detectors")
+    sub.add_argument("--net", default=DEFAULT_NET, help="SUMO network file")
+    sub.add_argument("--output", default="gjilaniData/gjilani.det.add.xml")
+    sub.add_argument("--length", type=float, default=100.0, help="max lane-area detector length (m)")
+    sub.add_argument("--freq", type=int, default=60, help="detector aggregation period (s)")
+    sub.set_defaults(func=cmd_detectors)
+
+    sub = subparsers.add_parser("routes", help="precompute the k-shortest alternative route table")
+    sub.add_argument("--net", default=DEFAULT_NET, help="SUMO network file")
+    sub.add_argument("--trips", default="gjilaniData/gjilan.trips.xml", help="trips file with the OD pairs")
+    sub.add_argument("--output", default="gjilaniData/route_table")
+    sub.add_argument("-k", type=int, default=5, help="alternatives per OD pair")
+    sub.add_argument("--min-count", type=int, default=1, help="minimum trips ending at the destination")
+    sub.add_argument("--max-pairs", type=int, default=500,
+                     help="OD pairs to compute, those with the most-used destinations first")
+    sub.set_defaults(func=cmd_routes)
+
+    sub = subparsers.add_parser("startup-bench", help="measure interpreter and import start-up times")
+    sub.add_argument("--repeat", type=int, default=3)
+    sub.set_defaults(func=cmd_startup_bench)
+    return parser
+
+
+if __name__ == "__main__":
+    args = build_parser().parse_args()
+    args.func(args)
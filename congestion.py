@@ -0,0 +1,62 @@
+import numpy as np
+import sumolib
+import traci
+import traci.constants as tc
+
+# Edge variables pulled for the whole network in one subscription batch
+EDGE_VARIABLES = (tc.LAST_STEP_VEHICLE_NUMBER, tc.LAST_STEP_MEAN_SPEED, tc.VAR_WAITING_TIME)
+
+
+class EdgeCongestion:
+    """Per-tick congestion scores for every edge of the network.
+
+    Must be created after traci.start(); it subscribes to all edges once and
+    every update() reads the batched subscription results instead of making
+    three TraCI calls per edge.
+    """
+
+    def __init__(self, net_file, weights=(0.5, 0.3, 0.2)):
+        net = sumolib.net.readNet(net_file)
+        edges = net.getEdges()
+        self.edge_ids = [edge.getID() for edge in edges]
+        self.index = {edge_id: i for i, edge_id in enumerate(self.edge_ids)}
+        self.max_speed = np.array([max(edge.getSpeed(), 0.1) for edge in edges])
+        self.weights = weights
+        self.time = None
+
+        # Empty edges report their speed limit as mean speed
+        self.vehicles = np.zeros(len(self.edge_ids))
+        self.speed = self.max_speed.copy()
+        self.waiting = np.zeros(len(self.edge_ids))
+        self.scores = np.zeros(len(self.edge_ids))
+
+        for edge_id in self.edge_ids:
+            traci.edge.subscribe(edge_id, EDGE_VARIABLES)
+
+    def update(self):
+        # Scores are computed once per simulation time, later calls reuse them
+        time = traci.simulation.getTime()
+        if time == self.time:
+            return self.scores
+        self.time = time
+
+        results = traci.edge.getAllSubscriptionResults()
+        known = [edge_id for edge_id in results if edge_id in self.index]
+        if known:
+            idx = np.fromiter((self.index[edge_id] for edge_id in known), dtype=int, count=len(known))
+            values = np.array([[results[edge_id][var] for var in EDGE_VARIABLES] for edge_id in known], dtype=float)
+            self.vehicles[idx] = values[:, 0]
+            self.speed[idx] = values[:, 1]
+            self.waiting[idx] = values[:, 2]
+
+        w_count, w_waiting, w_speed = self.weights
+        self.scores = (self.vehicles * w_count + (self.waiting / 60 * w_waiting) +
+                       ((self.max_speed - self.speed) / self.max_speed * w_speed))
+        return self.scores
+
+    def score(self, edge_id):
+        i = self.index.get(edge_id)
+        return self.scores[i] if i is not None else 0.0
+
+    def is_congested(self, edge_id, threshold):
+        return self.score(edge_id) > threshold
@@ -0,0 +1,122 @@
+import time
+from collections import defaultdict
+
+# Fraction of the per-tick budget each optimizer may use
+DEFAULT_SHARES = {
+    'traffic_lights': 0.5,
+    'routes': 0.3,
+    'roundabouts': 0.2,
+}
+
+
+def past_deadline(deadline):
+    return deadline is not None and time.perf_counter() > deadline
+
+
+class WorkCursor:
+    """Where work cut off at a deadline resumes on the next tick.
+
+    order() rotates the item list to start right after the last item marked
+    done, so under sustained overload every item is reached in turn instead
+    of the head of the list being processed again each tick.
+    """
+
+    def __init__(self):
+        self.last = None
+        self.position = 0
+        self.start = 0
+        self.count = 0
+
+    def order(self, items):
+        items = list(items)
+        if not items:
+            return items
+        try:
+            start = items.index(self.last) + 1
+        except ValueError:
+            # The last item is gone (e.g. vehicle arrived), fall back to its position
+            start = self.position
+        self.start = start % len(items)
+        self.count = 0
+        return items[self.start:] + items[:self.start]
+
+    def mark(self, item):
+        self.last = item
+        self.count += 1
+        self.position = self.start + self.count
+
+
+class ControlBudget:
+    """Wall-clock budget for the optimizers run in one control tick.
+
+    step_budget is in seconds (None = unlimited). Deferrable optimizers get a
+    deadline and a WorkCursor keyword and are expected to stop early when the
+    deadline passes and resume from the cursor on the next tick; they are
+    skipped entirely once the tick budget is used up. With realtime=True the
+    simulation is paced so one simulated second takes one wall-clock second.
+    """
+
+    def __init__(self, step_budget=None, shares=None, realtime=False, speed=1.0):
+        self.step_budget = step_budget
+        self.shares = dict(DEFAULT_SHARES, **(shares or {}))
+        self.realtime = realtime
+        self.speed = speed
+        self.tick_start = None
+        self.wall_start = None
+        self.sim_start = None
+        self.cursors = defaultdict(WorkCursor)
+        self.stats = defaultdict(lambda: {'runs': 0, 'overruns': 0, 'deferred': 0,
+                                          'total_time': 0.0, 'max_time': 0.0, 'overrun_time': 0.0})
+
+    def start_tick(self):
+        self.tick_start = time.perf_counter()
+
+    def remaining(self):
+        if self.step_budget is None:
+            return None
+        return self.tick_start + self.step_budget - time.perf_counter()
+
+    def run(self, name, optimizer, *args, deferrable=False, **kwargs):
+        stats = self.stats[name]
+        if self.step_budget is None:
+            allotted = deadline = None
+        else:
+            remaining = self.remaining()
+            if deferrable and remaining <= 0:
+                stats['deferred'] += 1
+                return None
+            allotted = self.step_budget * self.shares.get(name, 0)
+            deadline = time.perf_counter() + max(0.0, min(allotted, remaining))
+        if deferrable:
+            kwargs['deadline'] = deadline
+            kwargs['cursor'] = self.cursors[name]
+
+        start = time.perf_counter()
+        result = optimizer(*args, **kwargs)
+        elapsed = time.perf_counter() - start
+
+        stats['runs'] += 1
+        stats['total_time'] += elapsed
+        stats['max_time'] = max(stats['max_time'], elapsed)
+        if allotted is not None and elapsed > allotted:
+            stats['overruns'] += 1
+            stats['overrun_time'] += elapsed - allotted
+        return result
+
+    def pace(self, sim_time):
+        if not self.realtime:
+            return
+        now = time.perf_counter()
+        if self.wall_start is None:
+            self.wall_start, self.sim_start = now, sim_time
+            return
+        delay = self.wall_start + (sim_time - self.sim_start) / self.speed - now
+        if delay > 0:
+            time.sleep(delay)
+
+    def report(self):
+        print("Optimizer time budget report:")
+        for name, stats in self.stats.items():
+            avg = stats['total_time'] / stats['runs'] if stats['runs'] else 0.0
+            print(f"  {name}: {stats['runs']} runs, avg {avg * 1000:.1f} ms, max {stats['max_time'] * 1000:.1f} ms, "
+                  f"{stats['overruns']} overruns (+{stats['overrun_time'] * 1000:.1f} ms), {stats['deferred']} deferred")
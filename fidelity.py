@@ -0,0 +1,86 @@
+import csv
+import math
+import os
+
+# SUMO switch for the mesoscopic (queue-based) model
+MESO_ARGS = ["--mesosim", "true"]
+MICRO_ARGS = []
+
+
+def score_metrics(metrics):
+    # Lower is better; failed runs (None / empty) are ranked last
+    if not metrics:
+        return math.inf
+    travel = sum(m.get('avg_travel_time', 0) for m in metrics) / len(metrics)
+    waiting = sum(m.get('avg_waiting_time', 0) for m in metrics) / len(metrics)
+    return travel + 2 * waiting
+
+
+def ranking_agreement(meso_scores, micro_scores):
+    # Fraction of candidate pairs ordered the same way by both models
+    keys = list(micro_scores)
+    agree = total = 0
+    for i in range(len(keys)):
+        for j in range(i + 1, len(keys)):
+            a, b = keys[i], keys[j]
+            meso_order = meso_scores[a] - meso_scores[b]
+            micro_order = micro_scores[a] - micro_scores[b]
+            total += 1
+            if meso_order * micro_order > 0 or (meso_order == 0 and micro_order == 0):
+                agree += 1
+    return agree / total if total else 1.0
+
+
+def dual_fidelity_evaluate(candidates, evaluate, top_fraction=0.25, score=score_metrics, history_file=None):
+    """Screen candidates with mesoscopic SUMO, re-run the best microscopically.
+
+    evaluate(candidate, sumo_args) runs one simulation and returns its metrics
+    list. Returns (best_candidate, report); the report holds both score tables
+    and how well the meso ranking matched the micro one.
+    """
+    candidates = list(candidates)
+    if not candidates:
+        return None, {}
+
+    meso_scores = {}
+    for i, candidate in enumerate(candidates):
+        meso_scores[i] = score(evaluate(candidate, MESO_ARGS))
+        print(f"Meso screening {i + 1}/{len(candidates)}: score {meso_scores[i]:.2f}")
+
+    ranked = sorted(meso_scores, key=meso_scores.get)
+    keep = max(1, math.ceil(len(candidates) * top_fraction))
+    # Re-evaluate at least two candidates so the agreement is measurable
+    shortlist = ranked[:min(len(candidates), max(keep, 2))]
+
+    micro_scores = {}
+    for i in shortlist:
+        micro_scores[i] = score(evaluate(candidates[i], MICRO_ARGS))
+        print(f"Micro re-evaluation of candidate {i}: score {micro_scores[i]:.2f}")
+
+    best = min(micro_scores, key=micro_scores.get)
+    report = {
+        'candidates': len(candidates),
+        'top_fraction': top_fraction,
+        'micro_runs': len(shortlist),
+        'meso_scores': meso_scores,
+        'micro_scores': micro_scores,
+        'pairwise_agreement': ranking_agreement(meso_scores, micro_scores),
+        'best_agrees': best == shortlist[0],
+    }
+    print(f"Meso/micro pairwise ranking agreement: {report['pairwise_agreement']:.0%} "
+          f"(meso best {'kept' if report['best_agrees'] else 'overturned'})")
+
+    if history_file:
+        log_agreement(history_file, report)
+    return candidates[best], report
+
+
+def log_agreement(history_file, report):
+    # Append one row per screening so the threshold can be tuned across runs
+    new_file = not os.path.exists(history_file)
+    with open(history_file, 'a', newline='') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(['candidates', 'top_fraction', 'micro_runs', 'pairwise_agreement', 'best_agrees'])
+        writer.writerow([report['candidates'], report['top_fraction'], report['micro_runs'],
+                         report['pairwise_agreement'], int(report['best_agrees'])])
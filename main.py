@@ -1,6 +1,17 @@
 import traci
 import sumolib
 from collections import defaultdict
+from contextlib import nullcontext
+from congestion import EdgeCongestion
+from fidelity import dual_fidelity_evaluate
+from deadline import ControlBudget, WorkCursor, past_deadline
+from recorder import ActuationRecorder
+from trajectory import TrajectoryCapture
+from detectors import DetectorLayer
+from checkpoint import Checkpointer
+from routetable import RouteTable
+from multiclient import (CONTROL_ORDER, aggregate_metrics, collect_analytics, drain_analytics, multi_client_args,
+                         start_analytics_client)
 import numpy as np
 
 # Simple Q-learning parameters
@@ -9,10 +20,76 @@ LEARNING_RATE = 0.1
 DISCOUNT_FACTOR = 0.9
 EXPLORATION_RATE = 0.1
 
-def run_simulation(config_file, optimized=False):
+def reset_controller(seed=None):
+    # Fresh Q-table and RNG so runs do not learn from (or replay the draws of) earlier runs
+    Q_TABLE.clear()
+    np.random.seed(seed)
+
+def run_simulation(config_file, optimized=False, sumo_args=None, step_budget=None, realtime=False, record_file=None,
+                   trajectory_dir=None, trajectory_period=5, trajectory_bbox=None, trajectory_edges=None,
+                   trajectory_fraction=1.0, detector_file=None, analytics_client=False,
+                   port=None, analytics_cpu=None, checkpoint_dir=None, checkpoint_interval=300,
+                   route_table=None, seed=None):
+    recorder = None
+    capture = None
+    detectors = None
+    analytics = None
+    connected = False
+    checkpointer = None
+    if checkpoint_dir:
+        # Finished runs are not repeated; interrupted ones resume from the latest checkpoint
+        checkpointer = Checkpointer(checkpoint_dir, interval=checkpoint_interval)
+        result = checkpointer.load_result()
+        if result is not None:
+            print(f"Run in {checkpoint_dir} already finished, skipping")
+            return result
     try:
-        sumo_cmd = ["sumo", "-c", config_file]
-        traci.start(sumo_cmd)
+        sumo_cmd = ["sumo", "-c", config_file] + list(sumo_args or [])
+        if detector_file:
+            sumo_cmd += ["--additional-files", detector_file]
+        if checkpointer:
+            # Without the RNG in the saved state a resumed run diverges from an uninterrupted one
+            sumo_cmd += ["--save-state.rng", "true"]
+        if analytics_client:
+            # Metrics are gathered by a second TraCI client in its own process. It is
+            # spawned first: SUMO blocks traci.start until both clients have connected.
+            # A free port keeps parallel sweep jobs from colliding.
+            port = port or sumolib.miscutils.getFreeSocketPort()
+            analytics = start_analytics_client(port, 1200, cadence=10, cpu=analytics_cpu)
+            traci.start(sumo_cmd + multi_client_args(), port=port)
+            traci.setOrder(CONTROL_ORDER)
+        else:
+            traci.start(sumo_cmd)
+        connected = True
+        # Restore before anything subscribes to vehicles, loadState replaces them
+        restored = checkpointer.restore() if checkpointer else None
+        if not restored and (checkpointer or seed is not None):
+            # A fresh checkpointed run (also a retry that crashed before its first
+            # checkpoint) or a seeded evaluation must not inherit the Q-table and RNG
+            # of an earlier attempt; plain runs keep learning across episodes
+            reset_controller(seed)
+        if record_file:
+            # Log every actuation so the run can be replayed without the optimizers;
+            # a resumed run continues the log written up to the checkpoint
+            recorder = ActuationRecorder(record_file, resume=restored and restored.get('recorder'))
+            recorder.install()
+        if trajectory_dir:
+            # Sampled in-process replacement for the fcd/emission XML outputs
+            capture = TrajectoryCapture(trajectory_dir, period=trajectory_period, bbox=trajectory_bbox,
+                                        edges=trajectory_edges, vehicle_fraction=trajectory_fraction,
+                                        first_chunk=restored.get('trajectory_chunks', 0) if restored else 0)
+
+        net_file = config_file.replace('.sumocfg', '.net.xml')
+        congestion = EdgeCongestion(net_file)
+        # The net is static, read the roundabout lanes once instead of every tick
+        roundabout_lanes = get_roundabout_lanes(net_file)
+        # Precomputed alternatives replace the per-reroute findRoute path search
+        routes = RouteTable(route_table, congestion) if route_table else None
+        if detector_file:
+            # Junction approaches are read from detector subscriptions instead of lane polling
+            detectors = DetectorLayer(detector_file, net_file)
+        # Wall-clock budget per control tick (seconds), optional real-time pacing
+        budget = ControlBudget(step_budget, realtime=realtime)
         
         # Initialize performance metrics and history
         metrics = []
@@ -20,17 +97,49 @@ def run_simulation(config_file, optimized=False):
         waiting_history = []
         avg_speed_history = []
         state_history = []  # For RL state tracking
-
-        net_file = config_file.replace('.sumocfg', '.net.xml')
+        latest_analytics = aggregate_metrics(0, [])
+        if restored:
+            metrics = restored['metrics']
+            speed_history = restored['speed_history']
+            waiting_history = restored['waiting_history']
+            avg_speed_history = restored['avg_speed_history']
+            state_history = restored['state_history']
+            Q_TABLE.clear()
+            Q_TABLE.update(restored['q_table'])
+            np.random.set_state(restored['rng'])
+            if analytics and metrics:
+                latest_analytics = metrics[-1]
         
+        # Pacing sleeps, analytics and checkpoints are kept out of the recorded controller
+        # time, replay does none of them
+        untimed = recorder.untimed if recorder else nullcontext
+        if recorder:
+            recorder.start_loop()
         # Main simulation loop (1200 seconds as per sumocfg)
         while (traci.simulation.getMinExpectedNumber() > 0 and 
                traci.simulation.getTime() < 1200):
             traci.simulationStep()
+            with untimed():
+                budget.pace(traci.simulation.getTime())
+            if capture:
+                with untimed():
+                    capture.step(traci.simulation.getTime())
             
+            if analytics and traci.simulation.getTime() % 10 == 0:
+                # Aggregates of the analytics client go into the checkpointed metrics
+                with untimed():
+                    new_analytics = drain_analytics(analytics[2])
+                    metrics.extend(new_analytics)
+                latest_analytics = (new_analytics or [latest_analytics])[-1]
+
             if optimized and traci.simulation.getTime() >= 0:  # Start immediately
                 if traci.simulation.getTime() % 10 == 0:
-                    current_metrics = calculate_performance_metrics()
+                    if analytics:
+                        # Newest aggregate of the analytics client (up to one cadence old)
+                        # instead of a per-vehicle TraCI sweep on the control path
+                        current_metrics = latest_analytics
+                    else:
+                        current_metrics = calculate_performance_metrics()
                     current_avg_speed = current_metrics['avg_speed']
                     current_avg_waiting = current_metrics['avg_waiting_time']
                     current_co2 = current_metrics['total_co2']
@@ -45,13 +154,19 @@ def run_simulation(config_file, optimized=False):
                     else:
                         action = np.argmax(Q_TABLE[state])
                     
-                    # Apply action to traffic lights
-                    optimize_traffic_lights(action, net_file)
-                    optimize_roundabout_flow(net_file)
-                    optimize_routes()
+                    # Apply action to traffic lights; roundabout tuning and rerouting are
+                    # cut short or deferred when the tick budget runs out
+                    budget.start_tick()
+                    if detectors:
+                        detectors.update()
+                    budget.run('traffic_lights', optimize_traffic_lights, action, net_file, detectors=detectors)
+                    budget.run('roundabouts', optimize_roundabout_flow, roundabout_lanes, deferrable=True,
+                               detectors=detectors)
+                    budget.run('routes', optimize_routes, congestion, deferrable=True, routes=routes)
                     
-                    # Calculate reward
-                    new_metrics = calculate_performance_metrics()
+                    # Calculate reward; with the analytics client the latest aggregate
+                    # (the network after the previous action) serves as the reward too
+                    new_metrics = current_metrics if analytics else calculate_performance_metrics()
                     new_avg_speed = new_metrics['avg_speed']
                     new_avg_waiting = new_metrics['avg_waiting_time']
                     new_co2 = new_metrics['total_co2']
@@ -72,21 +187,66 @@ def run_simulation(config_file, optimized=False):
                 print(f"Simulation progress: {traci.simulation.getTime()//60} minutes")           
 
             # Collect data for analysis
-            if traci.simulation.getTime() % 10 == 0:
-                current_metrics = calculate_performance_metrics()
-                collect_traffic_data()
-                metrics.append(current_metrics)
-                speed_history.append(current_metrics['avg_speed'])
-                waiting_history.append(current_metrics['avg_waiting_time'])
+            if not analytics and traci.simulation.getTime() % 10 == 0:
+                with untimed():
+                    current_metrics = calculate_performance_metrics()
+                    collect_traffic_data(congestion)
+                    metrics.append(current_metrics)
+                    speed_history.append(current_metrics['avg_speed'])
+                    waiting_history.append(current_metrics['avg_waiting_time'])
 
+            if checkpointer and checkpointer.due(traci.simulation.getTime()):
+                # Timing state first, so the checkpoint itself is not counted after a resume
+                recorder_state = recorder.state(traci.simulation.getTime()) if recorder else None
+                with untimed():
+                    if capture:
+                        # Chunk boundary at the checkpoint, so a resume keeps exactly these chunks
+                        capture.flush()
+                    checkpointer.save(traci.simulation.getTime(), {
+                        'metrics': metrics,
+                        'speed_history': speed_history,
+                        'waiting_history': waiting_history,
+                        'avg_speed_history': avg_speed_history,
+                        'state_history': state_history,
+                        'q_table': dict(Q_TABLE),
+                        'rng': np.random.get_state(),
+                        'recorder': recorder_state,
+                        'trajectory_chunks': capture.chunks if capture else 0,
+                    })
+
+        if optimized and step_budget is not None:
+            budget.report()
+        if analytics:
+            # Release the control slot so the analytics client can finish its last tick
+            traci.close()
+            connected = False
+            if collect_analytics(*analytics[:2]) is None:
+                metrics = None
+            else:
+                # The client has exited, so its last aggregates are on the live queue
+                metrics.extend(drain_analytics(analytics[2]))
+        if checkpointer:
+            checkpointer.save_result(metrics)
         return metrics
         
     except Exception as e:
         print(f"Error during simulation: {e}")
+        if checkpointer and checkpointer.latest():
+            print(f"Rerun with checkpoint_dir={checkpoint_dir!r} to resume from {checkpointer.latest()['time']}s")
     finally:
-        traci.close()
+        if capture:
+            capture.close()
+        if recorder:
+            recorder.close()
+        if connected:
+            try:
+                traci.close()
+            except Exception as e:
+                # SUMO may already be gone; the sweep should retry rather than abort
+                print(f"Error closing TraCI connection: {e}")
 
-def collect_traffic_data():
+def collect_traffic_data(congestion):
+    congestion.update()
     data = {
         'time': traci.simulation.getTime(),
         'edges': {},
@@ -94,29 +254,29 @@ def collect_traffic_data():
         'avg_speed': 0
     }
     
-    total_speed = 0
-    vehicle_count = 0
-    
-    for edge_id in traci.edge.getIDList():
-        vehicles = traci.edge.getLastStepVehicleNumber(edge_id)
-        speed = traci.edge.getLastStepMeanSpeed(edge_id)
-        waiting = traci.edge.getWaitingTime(edge_id)
-        
+    for edge_id, vehicles, speed, waiting in zip(congestion.edge_ids, congestion.vehicles,
+                                                 congestion.speed, congestion.waiting):
         data['edges'][edge_id] = {
             'vehicles': vehicles,
             'speed': speed,
             'waiting': waiting
         }
-        
-        total_speed += speed * vehicles
-        vehicle_count += vehicles
     
+    vehicle_count = congestion.vehicles.sum()
     if vehicle_count > 0:
-        data['avg_speed'] = total_speed / vehicle_count
+        data['avg_speed'] = float((congestion.speed * congestion.vehicles).sum() / vehicle_count)
     
     return data
 
-def optimize_traffic_lights(action, net_file):
+# Phase demand thresholds (extend / switch above the first, reduce below the second).
+# Lane polling sees whole lanes and waiting minutes; detectors see at most 100 m
+# (about 13 vehicles), so their vehicles + queue demand tops out near 26.
+LANE_DEMAND_THRESHOLDS = (20, 10)
+DETECTOR_DEMAND_THRESHOLDS = (12, 6)
+# Circulating-lane occupancy (%) above which a slow roundabout lane counts as congested
+ROUNDABOUT_OCCUPANCY = 30.0
+
+def optimize_traffic_lights(action, net_file, detectors=None):
     tl_ids = traci.trafficlight.getIDList()
     for tl_id in tl_ids:
         current_phase = traci.trafficlight.getPhase(tl_id)
@@ -128,67 +288,90 @@ def optimize_traffic_lights(action, net_file):
 
         num_phases = len(current_program.getPhases())
         controlled_lanes = traci.trafficlight.getControlledLanes(tl_id)
-        lane_metrics = {lane: {'count': traci.lane.getLastStepVehicleNumber(lane),
-                              'waiting': traci.lane.getWaitingTime(lane) / 60,
-                              'speed': traci.lane.getLastStepMeanSpeed(lane)} 
-                        for lane in controlled_lanes}
+        if detectors:
+            lane_demand = detectors.lane_demand(controlled_lanes)
+            high_demand, low_demand = DETECTOR_DEMAND_THRESHOLDS
+        else:
+            lane_demand = {lane: traci.lane.getLastStepVehicleNumber(lane) + traci.lane.getWaitingTime(lane) / 60 * 2
+                           for lane in controlled_lanes}
+            high_demand, low_demand = LANE_DEMAND_THRESHOLDS
 
         green_lanes = set()
         for i, link in enumerate(traci.trafficlight.getControlledLinks(tl_id)):
             if link and current_program.getPhases()[current_phase].state[i] in ['G', 'g']:
                 green_lanes.add(link[0][0])
 
-        green_demand = sum(lane_metrics.get(lane, {'count': 0, 'waiting': 0})['count'] + 
-                          lane_metrics.get(lane, {'count': 0, 'waiting': 0})['waiting'] * 2 
-                          for lane in green_lanes) / max(1, len(green_lanes))
-        red_demand = sum(lane_metrics.get(lane, {'count': 0, 'waiting': 0})['count'] + 
-                        lane_metrics.get(lane, {'count': 0, 'waiting': 0})['waiting'] * 2 
-                        for lane in lane_metrics if lane not in green_lanes) / max(1, len(lane_metrics) - len(green_lanes))
+        green_demand = sum(lane_demand.get(lane, 0) for lane in green_lanes) / max(1, len(green_lanes))
+        red_demand = sum(demand for lane, demand in lane_demand.items()
+                         if lane not in green_lanes) / max(1, len(lane_demand) - len(green_lanes))
 
-        if action == 0 and green_demand > 20 and phase_duration < 30:  # Extend
+        if action == 0 and green_demand > high_demand and phase_duration < 30:  # Extend
             extension = min(5, 30 - phase_duration)
             traci.trafficlight.setPhaseDuration(tl_id, phase_duration + extension)
             print(f"Extended phase at {tl_id} by {extension}s (green: {green_demand}, red: {red_demand})")
-        elif action == 1 and green_demand < 10 and phase_duration > 5:  # Reduce
+        elif action == 1 and green_demand < low_demand and phase_duration > 5:  # Reduce
             reduction = max(-5, 5 - phase_duration)
             traci.trafficlight.setPhaseDuration(tl_id, phase_duration + reduction)
             print(f"Reduced phase at {tl_id} by {reduction}s (green: {green_demand}, red: {red_demand})")
-        elif action == 2 and red_demand > 20:  # Switch
+        elif action == 2 and red_demand > high_demand:  # Switch
             traci.trafficlight.setPhase(tl_id, (current_phase + 1) % num_phases)
             print(f"Switched phase early at {tl_id} (green: {green_demand}, red: {red_demand})")
 
-def optimize_roundabout_flow(net_file):
+def optimize_roundabout_flow(roundabout_lanes, deadline=None, detectors=None, cursor=None):
+    # roundabout_lanes: [(lane_id, lanes on its edge)] from get_roundabout_lanes
+    if detectors:
+        return optimize_roundabout_flow_detectors(detectors, deadline, cursor)
+    cursor = cursor or WorkCursor()
     try:
-        roundabout_edges = get_roundabout_edges(net_file)
-        for edge_id in roundabout_edges:
-            if edge_id not in traci.edge.getIDList():
-                continue
-            num_lanes = traci.edge.getLaneNumber(edge_id)
+        for lane_id, num_lanes in cursor.order(roundabout_lanes):
+            if past_deadline(deadline):
+                break
             vehicle_threshold = num_lanes * 2
             speed_threshold = 0.6 * 15
+            vehicle_count = traci.lane.getLastStepVehicleNumber(lane_id)
+            mean_speed = traci.lane.getLastStepMeanSpeed(lane_id)
 
-            for lane_index in range(num_lanes):
-                lane_id = f"{edge_id}_{lane_index}"
-                if lane_id not in traci.lane.getIDList():
-                    continue
-                vehicle_count = traci.lane.getLastStepVehicleNumber(lane_id)
-                mean_speed = traci.lane.getLastStepMeanSpeed(lane_id)
-
-                if vehicle_count > vehicle_threshold and mean_speed < speed_threshold:
-                    traci.lane.setParameter(lane_id, "stopOffset", "-0.5")
-                    print(f"Adjusted stopOffset at {lane_id} to -0.5")
-                else:
-                    traci.lane.setParameter(lane_id, "stopOffset", "0")
+            if vehicle_count > vehicle_threshold and mean_speed < speed_threshold:
+                traci.lane.setParameter(lane_id, "stopOffset", "-0.5")
+                print(f"Adjusted stopOffset at {lane_id} to -0.5")
+            else:
+                traci.lane.setParameter(lane_id, "stopOffset", "0")
+            cursor.mark((lane_id, num_lanes))
     except Exception as e:
         if traci.simulation.getTime() % 10 == 0:
             print(f"Roundabout optimization warning: {e}")
 
-def optimize_routes():
-    vehicles = traci.vehicle.getIDList()
+def optimize_roundabout_flow_detectors(detectors, deadline=None, cursor=None):
+    # Occupancy replaces the per-lane vehicle count of optimize_roundabout_flow, the
+    # speed condition is the same
+    lanes = detectors.group_lanes("roundabout:")
+    if not lanes:
+        return
+    idx = np.array([detectors.index[lane_id] for lane_id in lanes])
+    congested = dict(zip(lanes, (detectors.occupancy[idx] > ROUNDABOUT_OCCUPANCY) & (detectors.speed[idx] < 0.6 * 15)))
+
+    cursor = cursor or WorkCursor()
+    for lane_id in cursor.order(lanes):
+        if past_deadline(deadline):
+            break
+        if congested[lane_id]:
+            traci.lane.setParameter(lane_id, "stopOffset", "-0.5")
+            print(f"Adjusted stopOffset at {lane_id} to -0.5")
+        else:
+            traci.lane.setParameter(lane_id, "stopOffset", "0")
+        cursor.mark(lane_id)
+
+def optimize_routes(congestion, deadline=None, routes=None, cursor=None):
+    cursor = cursor or WorkCursor()
+    vehicles = cursor.order(traci.vehicle.getIDList())
     reroute_counts = defaultdict(int)
     max_reroute_threshold = 0.05
+    congestion.update()
 
     for veh_id in vehicles:
+        if past_deadline(deadline):
+            break
+        cursor.mark(veh_id)
         current_edge = traci.vehicle.getRoadID(veh_id)
         route = traci.vehicle.getRoute(veh_id)
         try:
@@ -197,47 +380,42 @@ def optimize_routes():
         except ValueError:
             continue
 
-        if next_edges and is_congested(next_edges[0]) and traci.vehicle.getWaitingTime(veh_id) > 120:
+        if next_edges and is_congested(congestion, next_edges[0]) and traci.vehicle.getWaitingTime(veh_id) > 120:
             destination = route[-1]
-            alternative_route = find_least_congested_route(current_edge, destination)
+            alternative_route = find_least_congested_route(current_edge, destination, congestion, routes,
+                                                           route[current_index:])
             if (alternative_route and alternative_route != route and 
-                reroute_counts[tuple(alternative_route)] / len(traci.edge.getIDList()) < max_reroute_threshold):
+                reroute_counts[tuple(alternative_route)] / len(congestion.edge_ids) < max_reroute_threshold):
                 traci.vehicle.setRoute(veh_id, alternative_route)
                 reroute_counts[tuple(alternative_route)] += 1
                 print(f"Rerouted {veh_id} to {alternative_route}")
 
-def is_congested(edge_id):
-    vehicle_count = traci.edge.getLastStepVehicleNumber(edge_id)
-    mean_speed = traci.edge.getLastStepMeanSpeed(edge_id)
-    waiting_time = traci.edge.getWaitingTime(edge_id)
-    max_speed = 15
-    congestion_score = (vehicle_count * 0.5 + (waiting_time / 60 * 0.3) + ((max_speed - mean_speed) / max_speed * 0.2))
-    return congestion_score > 8
+def is_congested(congestion, edge_id):
+    return congestion.is_congested(edge_id, 8)
 
-def find_least_congested_route(current_edge, destination):
+def find_least_congested_route(current_edge, destination, congestion, routes=None, current_route=None):
+    if routes:
+        # The vehicle's own remaining route is no alternative; fall back to findRoute instead
+        alternative = routes.best_route(current_edge, destination, current_route)
+        if alternative:
+            return alternative
     try:
-        def get_edge_weight(edge):
-            vehicle_count = traci.edge.getLastStepVehicleNumber(edge)
-            mean_speed = traci.edge.getLastStepMeanSpeed(edge)
-            waiting_time = traci.edge.getWaitingTime(edge)
-            max_speed = 15
-            return (vehicle_count * 0.5 + (waiting_time / 60 * 0.3) + ((max_speed - mean_speed) / max_speed * 0.2))
-        
         routes = traci.simulation.findRoute(current_edge, destination, routingMode=1)
         if routes and len(routes.edges) > 0:
-            routes.edges = [e for e in routes.edges if e in traci.edge.getIDList()]
+            routes.edges = [e for e in routes.edges if e in congestion.index]
             return routes.edges
     except traci.TraCIException:
         pass
     return None
 
-def get_roundabout_edges(net_file):
+def get_roundabout_lanes(net_file):
     net = sumolib.net.readNet(net_file)
-    roundabout_edges = set()
-    for r in net.getRoundabouts():
-        for edge_id in r.getEdges():
-            roundabout_edges.add(edge_id)
-    return list(roundabout_edges)
+    edge_ids = {edge_id for r in net.getRoundabouts() for edge_id in r.getEdges()}
+    lanes = []
+    for edge_id in sorted(edge_ids):
+        edge_lanes = net.getEdge(edge_id).getLanes()
+        lanes.extend((lane.getID(), len(edge_lanes)) for lane in edge_lanes)
+    return lanes
 
 def calculate_performance_metrics():
     metrics = {
@@ -271,6 +449,30 @@ def calculate_performance_metrics():
     
     return metrics
 
+def evaluate_scenario(scenario, sumo_args, seed=0):
+    # Every meso and micro evaluation starts from an empty Q-table and the same seed,
+    # otherwise meso runs would train the table the micro runs are scored with
+    config_file, optimized = scenario
+    return run_simulation(config_file, optimized=optimized, sumo_args=sumo_args, seed=seed)
+
+def run_sweep(scenarios, sweep_dir="sweep_results", retries=2, **kwargs):
+    # scenarios: {name: (config_file, optimized)}; each run checkpoints into its own directory
+    results = {}
+    for name, (config_file, optimized) in scenarios.items():
+        checkpoint_dir = f"{sweep_dir}/{name}"
+        for attempt in range(retries + 1):
+            results[name] = run_simulation(config_file, optimized=optimized, checkpoint_dir=checkpoint_dir, **kwargs)
+            if results[name] is not None:
+                break
+            if attempt < retries:
+                print(f"Run {name} failed, retrying from checkpoint ({attempt + 1}/{retries})")
+    return results
+
+def screen_scenarios(scenarios, top_fraction=0.25, history_file="fidelity_agreement.csv"):
+    # Meso pre-screening of (config_file, optimized) pairs, micro re-run of the best
+    return dual_fidelity_evaluate(scenarios, evaluate_scenario, top_fraction=top_fraction,
+                                  history_file=history_file)
+
 if __name__ == "__main__":
     performance_metrics = run_simulation("gjilaniData/gjilani.sumocfg")
     
@@ -1,6 +1,7 @@
 import traci
 import sumolib
 from collections import defaultdict
+from congestion import EdgeCongestion
 
 def run_simulation(config_file, optimized=False):
     try:
@@ -11,6 +12,7 @@ def run_simulation(config_file, optimized=False):
         metrics = []
 
         net_file = config_file.replace('.sumocfg', '.net.xml')
+        congestion = EdgeCongestion(net_file)
         
         # Main simulation loop (900 seconds as per sumocfg)
         while (traci.simulation.getMinExpectedNumber() > 0 and 
@@ -21,7 +23,7 @@ def run_simulation(config_file, optimized=False):
                 if traci.simulation.getTime() % 30 == 0:  # Run optimizations every 30 seconds
                     optimize_traffic_lights()
                     optimize_roundabout_flow(net_file)
-                    optimize_routes()
+                    optimize_routes(congestion)
                     prioritize_emergency_vehicles()
                     prioritize_public_transport()
 
@@ -30,7 +32,7 @@ def run_simulation(config_file, optimized=False):
 
             # Collect data for analysis
             if traci.simulation.getTime() % 10 == 0:
-                collect_traffic_data()
+                collect_traffic_data(congestion)
                 metrics.append(calculate_performance_metrics())
 
         return metrics
@@ -40,7 +42,8 @@ def run_simulation(config_file, optimized=False):
     finally:
         traci.close()
 
-def collect_traffic_data():
+def collect_traffic_data(congestion):
+    congestion.update()
     data = {
         'time': traci.simulation.getTime(),
         'edges': {},
@@ -48,25 +51,17 @@ def collect_traffic_data():
         'avg_speed': 0
     }
     
-    total_speed = 0
-    vehicle_count = 0
-    
-    for edge_id in traci.edge.getIDList():
-        vehicles = traci.edge.getLastStepVehicleNumber(edge_id)
-        speed = traci.edge.getLastStepMeanSpeed(edge_id)
-        waiting = traci.edge.getWaitingTime(edge_id)
-        
+    for edge_id, vehicles, speed, waiting in zip(congestion.edge_ids, congestion.vehicles,
+                                                 congestion.speed, congestion.waiting):
         data['edges'][edge_id] = {
             'vehicles': vehicles,
             'speed': speed,
             'waiting': waiting
         }
-        
-        total_speed += speed * vehicles
-        vehicle_count += vehicles
     
+    vehicle_count = congestion.vehicles.sum()
     if vehicle_count > 0:
-        data['avg_speed'] = total_speed / vehicle_count
+        data['avg_speed'] = float((congestion.speed * congestion.vehicles).sum() / vehicle_count)
     
     return data
 
@@ -142,10 +137,11 @@ def optimize_roundabout_flow(net_file):
         if traci.simulation.getTime() % 10 == 0:
             print(f"Roundabout optimization warning: {e}")
 
-def optimize_routes():
+def optimize_routes(congestion):
     vehicles = traci.vehicle.getIDList()
     reroute_counts = defaultdict(int)
     max_reroute_threshold = 0.15
+    congestion.update()
 
     for veh_id in vehicles:
         current_edge = traci.vehicle.getRoadID(veh_id)
@@ -156,35 +152,23 @@ def optimize_routes():
         except ValueError:
             continue
 
-        if next_edges and is_congested(next_edges[0]) and traci.vehicle.getWaitingTime(veh_id) > 60:
+        if next_edges and is_congested(congestion, next_edges[0]) and traci.vehicle.getWaitingTime(veh_id) > 60:
             destination = route[-1]
-            alternative_route = find_least_congested_route(current_edge, destination)
+            alternative_route = find_least_congested_route(current_edge, destination, congestion)
             if (alternative_route and alternative_route != route and 
-                reroute_counts[tuple(alternative_route)] / len(traci.edge.getIDList()) < max_reroute_threshold):
+                reroute_counts[tuple(alternative_route)] / len(congestion.edge_ids) < max_reroute_threshold):
                 traci.vehicle.setRoute(veh_id, alternative_route)
                 reroute_counts[tuple(alternative_route)] += 1
                 print(f"Rerouted {veh_id} to {alternative_route}")
 
-def is_congested(edge_id):
-    vehicle_count = traci.edge.getLastStepVehicleNumber(edge_id)
-    mean_speed = traci.edge.getLastStepMeanSpeed(edge_id)
-    waiting_time = traci.edge.getWaitingTime(edge_id)
-    max_speed = 15
-    congestion_score = (vehicle_count * 0.5 + (waiting_time / 60 * 0.3) + ((max_speed - mean_speed) / max_speed * 0.2))
-    return congestion_score > 5
+def is_congested(congestion, edge_id):
+    return congestion.is_congested(edge_id, 5)
 
-def find_least_congested_route(current_edge, destination):
+def find_least_congested_route(current_edge, destination, congestion):
     try:
-        def get_edge_weight(edge):
-            vehicle_count = traci.edge.getLastStepVehicleNumber(edge)
-            mean_speed = traci.edge.getLastStepMeanSpeed(edge)
-            waiting_time = traci.edge.getWaitingTime(edge)
-            max_speed = 15
-            return (vehicle_count * 0.5 + (waiting_time / 60 * 0.3) + ((max_speed - mean_speed) / max_speed * 0.2))
-        
         routes = traci.simulation.findRoute(current_edge, destination, routingMode=1)
         if routes and len(routes.edges) > 0:
-            routes.edges = [e for e in routes.edges if e in traci.edge.getIDList()]
+            routes.edges = [e for e in routes.edges if e in congestion.index]
             return routes.edges
     except traci.TraCIException:
         pass
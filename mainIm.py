@@ -2,33 +2,39 @@ import traci
 import sumolib
 from collections import defaultdict
 import numpy as np
-from sklearn.linear_model import LinearRegression
+from congestion import EdgeCongestion
+from trajectory import TrajectoryCapture
 
-def run_separate_simulations():
+# Seconds between trajectory samples (replaces --fcd-output / --emission-output)
+TRAJECTORY_PERIOD = 5
+
+def run_separate_simulations(config_file="gjilaniData/gjilani.sumocfg"):
+    net_file = config_file.replace('.sumocfg', '.net.xml')
     # Original simulation
     print("Running original simulation...")
     
     # Original simulation command (no optimization)
     sumo_cmd_original = [
         "sumo", 
-        "-c", "gjilaniData/gjilani.sumocfg",
-        "--emission-output", "gjilaniData/output_emissions.xml",
-        "--fcd-output", "gjilaniData/output_fcd.xml",
+        "-c", config_file,
         "--queue-output", "gjilaniData/output_queues.xml",
         "--summary-output", "gjilaniData/output_summary.xml",
         "--duration", "1200"  # Run for 20 minutes
     ]
     
     traci.start(sumo_cmd_original)
+    capture = TrajectoryCapture("gjilaniData/output_trajectories", period=TRAJECTORY_PERIOD)
     
     # Run original simulation (without optimization)
     while (traci.simulation.getMinExpectedNumber() > 0 and 
            traci.simulation.getTime() < 1200):  # 20 minutes
         traci.simulationStep()
+        capture.step(traci.simulation.getTime())
         
         if traci.simulation.getTime() % 60 == 0:
             print(f"Original simulation progress: {traci.simulation.getTime()//60} minutes")
     
+    capture.close()
     traci.close()
     
     # Optimized simulation
@@ -37,15 +43,15 @@ def run_separate_simulations():
     # Optimized simulation command (with optimization)
     sumo_cmd_optimized = [
         "sumo", 
-        "-c", "gjilaniData/gjilani.sumocfg",
-        "--emission-output", "gjilaniData/optimized_output_emissions.xml",
-        "--fcd-output", "gjilaniData/optimized_output_fcd.xml",
+        "-c", config_file,
         "--queue-output", "gjilaniData/optimized_output_queues.xml",
         "--summary-output", "gjilaniData/optimized_output_summary.xml",
         "--duration", "1200"  # Run for 20 minutes
     ]
     
     traci.start(sumo_cmd_optimized)
+    congestion = EdgeCongestion(net_file, weights=(0.6, 0.4, 0.3))
+    capture = TrajectoryCapture("gjilaniData/optimized_output_trajectories", period=TRAJECTORY_PERIOD)
     
     # Initialize metrics tracking
     metrics = []
@@ -56,6 +62,7 @@ def run_separate_simulations():
     while (traci.simulation.getMinExpectedNumber() > 0 and 
            traci.simulation.getTime() < 1200):  # 20 minutes
         traci.simulationStep()
+        capture.step(traci.simulation.getTime())
         
         # Apply optimizations after initial period
         if traci.simulation.getTime() >= 30:  # Start optimization after 30 seconds
@@ -75,8 +82,8 @@ def run_separate_simulations():
                             
                         # Apply optimizations
                         optimize_traffic_lights(threshold_factor)
-                        optimize_roundabout_flow("gjilaniData/gjilani.net.xml", threshold_factor)
-                        optimize_routes(threshold_factor)
+                        optimize_roundabout_flow(net_file, threshold_factor)
+                        optimize_routes(congestion, threshold_factor)
                         
                     # Track history
                     speed_history.append(current_avg_speed)
@@ -88,10 +95,12 @@ def run_separate_simulations():
         if traci.simulation.getTime() % 60 == 0:
             print(f"Optimized simulation progress: {traci.simulation.getTime()//60} minutes")
     
+    capture.close()
     traci.close()
     print("\nBoth simulations completed successfully!")
 
-def collect_traffic_data():
+def collect_traffic_data(congestion):
+    congestion.update()
     data = {
         'time': traci.simulation.getTime(),
         'edges': {},
@@ -99,25 +108,17 @@ def collect_traffic_data():
         'avg_speed': 0
     }
     
-    total_speed = 0
-    vehicle_count = 0
-    
-    for edge_id in traci.edge.getIDList():
-        vehicles = traci.edge.getLastStepVehicleNumber(edge_id)
-        speed = traci.edge.getLastStepMeanSpeed(edge_id)
-        waiting = traci.edge.getWaitingTime(edge_id)
-        
+    for edge_id, vehicles, speed, waiting in zip(congestion.edge_ids, congestion.vehicles,
+                                                 congestion.speed, congestion.waiting):
         data['edges'][edge_id] = {
             'vehicles': vehicles,
             'speed': speed,
             'waiting': waiting
         }
-        
-        total_speed += speed * vehicles
-        vehicle_count += vehicles
     
+    vehicle_count = congestion.vehicles.sum()
     if vehicle_count > 0:
-        data['avg_speed'] = total_speed / vehicle_count
+        data['avg_speed'] = float((congestion.speed * congestion.vehicles).sum() / vehicle_count)
     
     return data
 
@@ -193,11 +194,12 @@ def optimize_roundabout_flow(net_file, threshold_factor):
         if traci.simulation.getTime() % 10 == 0:
             print(f"Roundabout optimization warning: {e}")
 
-def optimize_routes(threshold_factor):
+def optimize_routes(congestion, threshold_factor):
     vehicles = traci.vehicle.getIDList()
     reroute_counts = defaultdict(int)
     max_reroute_threshold = 0.2 / threshold_factor  # Higher value = more rerouting
     reroutes_made = 0
+    congestion.update()
 
     for veh_id in vehicles:
         current_edge = traci.vehicle.getRoadID(veh_id)
@@ -209,11 +211,11 @@ def optimize_routes(threshold_factor):
             continue
 
         # Lower waiting time threshold for rerouting
-        if next_edges and is_congested(next_edges[0]) and traci.vehicle.getWaitingTime(veh_id) > 40 * threshold_factor:
+        if next_edges and is_congested(congestion, next_edges[0]) and traci.vehicle.getWaitingTime(veh_id) > 40 * threshold_factor:
             destination = route[-1]
-            alternative_route = find_least_congested_route(current_edge, destination)
+            alternative_route = find_least_congested_route(current_edge, destination, congestion)
             if (alternative_route and alternative_route != route and 
-                reroute_counts[tuple(alternative_route)] / len(traci.edge.getIDList()) < max_reroute_threshold):
+                reroute_counts[tuple(alternative_route)] / len(congestion.edge_ids) < max_reroute_threshold):
                 traci.vehicle.setRoute(veh_id, alternative_route)
                 reroute_counts[tuple(alternative_route)] += 1
                 reroutes_made += 1
@@ -223,28 +225,15 @@ def optimize_routes(threshold_factor):
         print(f"Rerouted {reroutes_made} vehicles")
     return reroutes_made
 
-def is_congested(edge_id):
-    vehicle_count = traci.edge.getLastStepVehicleNumber(edge_id)
-    mean_speed = traci.edge.getLastStepMeanSpeed(edge_id)
-    waiting_time = traci.edge.getWaitingTime(edge_id)
-    max_speed = 15
-    
-    # More sensitive congestion detection
-    congestion_score = (vehicle_count * 0.6 + (waiting_time / 60 * 0.4) + ((max_speed - mean_speed) / max_speed * 0.3))
-    return congestion_score > 5  # Lower threshold to detect congestion earlier
+def is_congested(congestion, edge_id):
+    # More sensitive congestion detection (weights 0.6/0.4/0.3), lower threshold to detect congestion earlier
+    return congestion.is_congested(edge_id, 5)
 
-def find_least_congested_route(current_edge, destination):
+def find_least_congested_route(current_edge, destination, congestion):
     try:
-        def get_edge_weight(edge):
-            vehicle_count = traci.edge.getLastStepVehicleNumber(edge)
-            mean_speed = traci.edge.getLastStepMeanSpeed(edge)
-            waiting_time = traci.edge.getWaitingTime(edge)
-            max_speed = 15
-            return (vehicle_count * 0.5 + (waiting_time / 60 * 0.3) + ((max_speed - mean_speed) / max_speed * 0.2))
-        
         routes = traci.simulation.findRoute(current_edge, destination, routingMode=1)
         if routes and len(routes.edges) > 0:
-            routes.edges = [e for e in routes.edges if e in traci.edge.getIDList()]
+            routes.edges = [e for e in routes.edges if e in congestion.index]
             return routes.edges
     except traci.TraCIException:
         pass
@@ -0,0 +1,135 @@
+"""Analytics as a second TraCI client.
+
+SUMO is started with --num-clients 2. The control process is client 1 and
+issues actuations every step; an analytics process (client 2) steps at its
+own cadence, reads vehicle state through subscriptions and aggregates the
+same metrics as calculate_performance_metrics, so heavy analytics never
+delays the control decisions and runs on its own core. Every aggregate is
+put on a live queue the controller drains into its metrics and uses for its
+Q-learning state and reward instead of sweeping all vehicles itself.
+
+The analytics process must be started before SUMO: with --num-clients 2
+SUMO answers no command (including the getVersion() at the end of
+traci.start) until both clients are connected.
+"""
+import multiprocessing as mp
+import os
+import queue
+
+import numpy as np
+import traci
+import traci.constants as tc
+
+CONTROL_ORDER = 1
+ANALYTICS_ORDER = 2
+NUM_CLIENTS = 2
+CONNECT_RETRIES = 60  # seconds the analytics client waits for SUMO to come up
+
+VEHICLE_VARIABLES = (tc.VAR_SPEED, tc.VAR_WAITING_TIME, tc.VAR_CO2EMISSION, tc.VAR_DEPARTURE)
+
+
+def multi_client_args():
+    return ["--num-clients", str(NUM_CLIENTS)]
+
+
+def aggregate_metrics(sim_time, values):
+    # values: rows of VEHICLE_VARIABLES for the vehicles currently in the network
+    metrics = {
+        'timestamp': sim_time,
+        'vehicle_count': len(values),
+        'total_travel_time': 0,
+        'total_waiting_time': 0,
+        'total_co2': 0,
+        'avg_travel_time': 0,
+        'avg_waiting_time': 0,
+        'avg_speed': 0
+    }
+    if not len(values):
+        return metrics
+
+    values = np.asarray(values, dtype=float)
+    speed, waiting, co2, depart = values.T
+    count = len(values)
+    metrics.update({
+        'total_travel_time': float((sim_time - depart[depart >= 0]).sum()),
+        'total_waiting_time': float(waiting.sum()),
+        'total_co2': float(co2.sum()),
+    })
+    metrics.update({
+        'avg_travel_time': metrics['total_travel_time'] / count,
+        'avg_waiting_time': metrics['total_waiting_time'] / count,
+        'avg_speed': float(speed.sum()) / count
+    })
+    return metrics
+
+
+def analytics_client(port, end_time, cadence, results, live, cpu=None):
+    if cpu is not None and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, {cpu})
+
+    traci.init(port, numRetries=CONNECT_RETRIES)
+    traci.setOrder(ANALYTICS_ORDER)
+    subscribed = set()
+    published = 0
+    try:
+        sim_time = traci.simulation.getTime()
+        while (traci.simulation.getMinExpectedNumber() > 0 and sim_time < end_time):
+            # Other clients keep stepping while this one waits for the target time
+            traci.simulationStep(sim_time + cadence)
+            sim_time = traci.simulation.getTime()
+
+            vehicle_ids = traci.vehicle.getIDList()
+            current = traci.vehicle.getAllSubscriptionResults()
+            rows = []
+            for veh_id in vehicle_ids:
+                if veh_id in subscribed and veh_id in current:
+                    rows.append([current[veh_id][var] for var in VEHICLE_VARIABLES])
+                else:
+                    # First sighting: subscribe for later ticks, read once directly
+                    traci.vehicle.subscribe(veh_id, VEHICLE_VARIABLES)
+                    subscribed.add(veh_id)
+                    rows.append([traci.vehicle.getSpeed(veh_id), traci.vehicle.getWaitingTime(veh_id),
+                                 traci.vehicle.getCO2Emission(veh_id), traci.vehicle.getDeparture(veh_id)])
+            subscribed.intersection_update(vehicle_ids)
+            live.put(aggregate_metrics(sim_time, rows))
+            published += 1
+    except traci.FatalTraCIError as e:
+        print(f"Analytics client stopped: {e}")
+    finally:
+        # Only a completion count; the aggregates themselves went over the live queue
+        results.put(published)
+        try:
+            traci.close()
+        except traci.FatalTraCIError:
+            pass
+
+
+def start_analytics_client(port, end_time, cadence=10, cpu=None):
+    # spawn, so the child does not inherit the control process' TraCI connection
+    context = mp.get_context("spawn")
+    results = context.Queue()
+    live = context.Queue()
+    process = context.Process(target=analytics_client, args=(port, end_time, cadence, results, live, cpu),
+                              daemon=True)
+    process.start()
+    return process, results, live
+
+
+def drain_analytics(live):
+    # Aggregates published since the last call, without waiting for the next one
+    metrics = []
+    while True:
+        try:
+            metrics.append(live.get_nowait())
+        except queue.Empty:
+            return metrics
+
+
+def collect_analytics(process, results, timeout=60):
+    # Number of aggregates the client published, or None if it did not finish
+    try:
+        published = results.get(timeout=timeout)
+    except Exception:
+        published = None
+    process.join(timeout)
+    return published
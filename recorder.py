@@ -0,0 +1,292 @@
+import os
+import struct
+import time
+from contextlib import contextmanager
+
+import traci
+
+# Binary actuation log: magic + version, then one record per actuation.
+# Ids, keys and values are interned in a string table written inline, so
+# every record after the first reference is a few fixed-size integers.
+MAGIC = b'ACTL'
+VERSION = 2
+
+OP_STRING = 0
+OP_SET_PHASE = 1
+OP_SET_PHASE_DURATION = 2
+OP_SET_ROUTE = 3
+OP_SET_PARAMETER = 4
+OP_END = 5
+
+HEADER = struct.Struct('<4sB')
+OP = struct.Struct('<B')
+STRING = struct.Struct('<I')
+SET_PHASE = struct.Struct('<dIi')
+SET_PHASE_DURATION = struct.Struct('<dId')
+SET_ROUTE = struct.Struct('<dIH')
+SET_PARAMETER = struct.Struct('<dBIII')
+END = struct.Struct('<ddd')
+
+PARAMETER_DOMAINS = ['lane', 'vehicle', 'trafficlight']
+
+
+class ActuationRecorder:
+    """Logs every controller actuation with its simulation time.
+
+    install() wraps the TraCI setters used by the optimizers so existing code
+    is recorded unchanged; uninstall() / close() restore them. Passing the
+    state() saved with a checkpoint as `resume` continues the existing log:
+    actuations logged after the checkpoint are dropped (the resumed run
+    repeats them) and the timing carries over.
+    """
+
+    def __init__(self, log_file, resume=None):
+        self.strings = {}
+        self.time = None
+        self.count = 0
+        self.originals = []
+        # Only the step loop is timed: net parsing and setup happen before
+        # start_loop(), analytics inside the loop are wrapped in untimed()
+        self.loop_start = None
+        self.excluded = 0.0
+        self.loop_offset = 0.0
+        self.step_time = 0.0
+
+        if resume and os.path.exists(log_file):
+            with open(log_file, 'rb') as f:
+                data = f.read()
+            strings, actuations, _, end = _scan(data, log_file, until=resume['time'])
+            self.file = open(log_file, 'r+b')
+            self.file.truncate(end)
+            self.file.seek(end)
+            self.strings = {value: index for index, value in enumerate(strings)}
+            self.count = len(actuations)
+            self.loop_offset = resume['loop_time']
+            self.step_time = resume['step_time']
+        else:
+            self.file = open(log_file, 'wb')
+            self.file.write(HEADER.pack(MAGIC, VERSION))
+
+    def _string(self, value):
+        index = self.strings.get(value)
+        if index is None:
+            index = len(self.strings)
+            self.strings[value] = index
+            data = str(value).encode('utf-8')
+            self.file.write(OP.pack(OP_STRING) + STRING.pack(len(data)) + data)
+        return index
+
+    def _now(self):
+        # One getTime() per step with actuations, invalidated by simulationStep
+        if self.time is None:
+            self.time = traci.simulation.getTime()
+        return self.time
+
+    def set_phase(self, tl_id, phase):
+        self.file.write(OP.pack(OP_SET_PHASE) + SET_PHASE.pack(self._now(), self._string(tl_id), phase))
+        self.count += 1
+
+    def set_phase_duration(self, tl_id, duration):
+        self.file.write(OP.pack(OP_SET_PHASE_DURATION) +
+                        SET_PHASE_DURATION.pack(self._now(), self._string(tl_id), duration))
+        self.count += 1
+
+    def set_route(self, veh_id, edges):
+        edge_indices = [self._string(edge) for edge in edges]
+        self.file.write(OP.pack(OP_SET_ROUTE) + SET_ROUTE.pack(self._now(), self._string(veh_id), len(edge_indices)) +
+                        struct.pack(f'<{len(edge_indices)}I', *edge_indices))
+        self.count += 1
+
+    def set_parameter(self, domain, object_id, key, value):
+        self.file.write(OP.pack(OP_SET_PARAMETER) +
+                        SET_PARAMETER.pack(self._now(), PARAMETER_DOMAINS.index(domain), self._string(object_id),
+                                           self._string(key), self._string(value)))
+        self.count += 1
+
+    def _wrap(self, domain, name, record):
+        original = getattr(domain, name)
+
+        def wrapper(*args, **kwargs):
+            result = original(*args, **kwargs)
+            record(*args, **kwargs)
+            return result
+
+        self.originals.append((domain, name, original))
+        setattr(domain, name, wrapper)
+
+    def install(self):
+        self._wrap(traci.trafficlight, 'setPhase', self.set_phase)
+        self._wrap(traci.trafficlight, 'setPhaseDuration', self.set_phase_duration)
+        self._wrap(traci.vehicle, 'setRoute', self.set_route)
+        for domain in PARAMETER_DOMAINS:
+            self._wrap(getattr(traci, domain), 'setParameter',
+                       lambda object_id, key, value, domain=domain: self.set_parameter(domain, object_id, key, value))
+
+        original_step = traci.simulationStep
+
+        def step(*args, **kwargs):
+            self.time = None
+            start = time.perf_counter()
+            result = original_step(*args, **kwargs)
+            self.step_time += time.perf_counter() - start
+            return result
+
+        self.originals.append((traci, 'simulationStep', original_step))
+        traci.simulationStep = step
+
+    def start_loop(self):
+        self.loop_start = time.perf_counter()
+
+    @contextmanager
+    def untimed(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.excluded += time.perf_counter() - start
+
+    def loop_time(self):
+        if self.loop_start is None:
+            return self.loop_offset
+        return self.loop_offset + time.perf_counter() - self.loop_start - self.excluded
+
+    def state(self, sim_time):
+        # Saved with a checkpoint, passed back as ActuationRecorder(resume=...)
+        self.file.flush()
+        return {'time': sim_time, 'loop_time': self.loop_time(), 'step_time': self.step_time}
+
+    def uninstall(self):
+        for domain, name, original in reversed(self.originals):
+            setattr(domain, name, original)
+        self.originals = []
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.uninstall()
+        # Live loop and SUMO step times let replay separate SUMO time from controller time
+        live_time = self.loop_time()
+        self.file.write(OP.pack(OP_END) + END.pack(self.time or 0.0, live_time, self.step_time))
+        self.file.close()
+        print(f"Recorded {self.count} actuations, step loop {live_time:.1f}s (SUMO {self.step_time:.1f}s)")
+
+
+def read_actuations(log_file):
+    """Returns (actuations, live_timing); actuations are (time, op, args) tuples.
+
+    live_timing is (loop_time, sumo_step_time) of the recorded run, or None if
+    the log was not closed cleanly.
+    """
+    with open(log_file, 'rb') as f:
+        data = f.read()
+    _, actuations, live_timing, _ = _scan(data, log_file)
+    return actuations, live_timing
+
+
+def _scan(data, log_file, until=None):
+    # Returns (strings, actuations, live_timing, end offset). With `until` the
+    # scan stops before the first actuation after that time or the END record,
+    # so the log can be truncated there and appended to.
+    if len(data) < HEADER.size or HEADER.unpack_from(data, 0) != (MAGIC, VERSION):
+        raise ValueError(f"{log_file} is not an actuation log")
+
+    strings = []
+    actuations = []
+    live_timing = None
+    offset = HEADER.size
+    while offset < len(data):
+        start = offset
+        try:
+            (op,), offset = OP.unpack_from(data, offset), offset + OP.size
+            if op == OP_STRING:
+                (length,) = STRING.unpack_from(data, offset)
+                offset += STRING.size
+                if offset + length > len(data):
+                    raise struct.error("truncated string")
+                strings.append(data[offset:offset + length].decode('utf-8'))
+                offset += length
+            elif op == OP_SET_PHASE:
+                t, tl, phase = SET_PHASE.unpack_from(data, offset)
+                offset += SET_PHASE.size
+                actuations.append((t, op, (strings[tl], phase)))
+            elif op == OP_SET_PHASE_DURATION:
+                t, tl, duration = SET_PHASE_DURATION.unpack_from(data, offset)
+                offset += SET_PHASE_DURATION.size
+                actuations.append((t, op, (strings[tl], duration)))
+            elif op == OP_SET_ROUTE:
+                t, veh, count = SET_ROUTE.unpack_from(data, offset)
+                offset += SET_ROUTE.size
+                edges = struct.unpack_from(f'<{count}I', data, offset)
+                offset += 4 * count
+                actuations.append((t, op, (strings[veh], [strings[e] for e in edges])))
+            elif op == OP_SET_PARAMETER:
+                t, domain, obj, key, value = SET_PARAMETER.unpack_from(data, offset)
+                offset += SET_PARAMETER.size
+                actuations.append((t, op, (PARAMETER_DOMAINS[domain], strings[obj], strings[key], strings[value])))
+            elif op == OP_END:
+                if until is not None:
+                    return strings, actuations, live_timing, start
+                _, loop_time, step_time = END.unpack_from(data, offset)
+                live_timing = (loop_time, step_time)
+                offset += END.size
+            else:
+                raise ValueError(f"Unknown record type {op} at byte {start}")
+        except struct.error:
+            # Last record cut off by a crash, everything before it is intact
+            return strings, actuations, live_timing, start
+        if until is not None and actuations and actuations[-1][0] > until:
+            actuations.pop()
+            return strings, actuations, live_timing, start
+    return strings, actuations, live_timing, offset
+
+
+def apply_actuation(op, args):
+    if op == OP_SET_PHASE:
+        traci.trafficlight.setPhase(*args)
+    elif op == OP_SET_PHASE_DURATION:
+        traci.trafficlight.setPhaseDuration(*args)
+    elif op == OP_SET_ROUTE:
+        traci.vehicle.setRoute(*args)
+    elif op == OP_SET_PARAMETER:
+        domain, object_id, key, value = args
+        getattr(traci, domain).setParameter(object_id, key, value)
+
+
+def replay_simulation(config_file, log_file, sumo_args=None, end_time=1200):
+    """Re-applies a recorded run with all optimizer logic switched off.
+
+    Pass the same sumo_args (including --additional-files) as the live run.
+    """
+    actuations, live_timing = read_actuations(log_file)
+    sumo_cmd = ["sumo", "-c", config_file] + list(sumo_args or [])
+    traci.start(sumo_cmd)
+
+    failed = 0
+    next_index = 0
+    step_time = 0.0
+    loop_start = time.perf_counter()
+    try:
+        while (traci.simulation.getMinExpectedNumber() > 0 and
+               traci.simulation.getTime() < end_time):
+            step_start = time.perf_counter()
+            traci.simulationStep()
+            step_time += time.perf_counter() - step_start
+            current_time = traci.simulation.getTime()
+            while next_index < len(actuations) and actuations[next_index][0] <= current_time:
+                _, op, args = actuations[next_index]
+                next_index += 1
+                try:
+                    apply_actuation(op, args)
+                except traci.TraCIException:
+                    failed += 1
+        replay_time = time.perf_counter() - loop_start
+    finally:
+        traci.close()
+
+    print(f"Replayed {next_index}/{len(actuations)} actuations: step loop {replay_time:.1f}s "
+          f"(SUMO {step_time:.1f}s, {failed} failed)")
+    if live_timing is not None:
+        live_time, live_step_time = live_timing
+        print(f"Live step loop {live_time:.1f}s (SUMO {live_step_time:.1f}s), "
+              f"controller overhead ~{live_time - replay_time:.1f}s")
+    return replay_time, live_timing
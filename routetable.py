@@ -0,0 +1,223 @@
+"""Precomputed k-shortest alternative routes for the Gjilan network.
+
+Offline, for the OD edge pairs found in a trips file, the k shortest loopless
+routes (Yen's algorithm on free-flow travel time) are computed from the
+sumolib network and stored edge-index encoded in .npy files:
+
+    python routetable.py gjilaniData/gjilani.net.xml gjilaniData/gjilan.trips.xml gjilaniData/route_table
+
+Trips generated with randomTrips have (almost) no repeated OD edge pairs, so
+pairs are ranked by how many trips share their destination edge, the key
+RouteTable looks routes up by, and only the first max_pairs (default
+DEFAULT_MAX_PAIRS) are computed; Yen runs in pure Python per pair.
+
+At runtime RouteTable memory-maps those files and picks the cheapest stored
+alternative under the current per-edge costs from EdgeCongestion.
+"""
+import argparse
+import heapq
+import os
+import xml.etree.ElementTree as ET
+from collections import Counter
+
+import numpy as np
+
+MIN_SPEED = 0.5  # m/s, keeps standing queues from producing infinite costs
+DEFAULT_MAX_PAIRS = 500
+
+
+def read_od_pairs(trips_file, min_count=1, max_pairs=DEFAULT_MAX_PAIRS):
+    # min_count applies to the trips ending at the pair's destination
+    counts = Counter()
+    destinations = Counter()
+    for _, element in ET.iterparse(trips_file):
+        if element.tag == "trip" and element.get("from") and element.get("to"):
+            counts[(element.get("from"), element.get("to"))] += 1
+            destinations[element.get("to")] += 1
+        element.clear()
+    ranked = sorted(counts, key=lambda pair: (-destinations[pair[1]], -counts[pair]))
+    return [pair for pair in ranked if destinations[pair[1]] >= min_count][:max_pairs]
+
+
+def build_graph(net, vclass="passenger"):
+    edges = [edge for edge in net.getEdges() if edge.allows(vclass)]
+    index = {edge.getID(): i for i, edge in enumerate(edges)}
+    successors = [[index[to.getID()] for to in edge.getOutgoing() if to.getID() in index] for edge in edges]
+    lengths = np.array([edge.getLength() for edge in edges])
+    speeds = np.array([max(edge.getSpeed(), MIN_SPEED) for edge in edges])
+    return [edge.getID() for edge in edges], index, successors, lengths, speeds
+
+
+def shortest_path(successors, cost, source, target, blocked_nodes=(), blocked_links=()):
+    # Dijkstra on the edge graph; a path's cost includes every edge it uses
+    dist = {source: cost[source]}
+    previous = {}
+    heap = [(cost[source], source)]
+    while heap:
+        d, node = heapq.heappop(heap)
+        if node == target:
+            path = [node]
+            while node in previous:
+                node = previous[node]
+                path.append(node)
+            return path[::-1], d
+        if d > dist[node]:
+            continue
+        for succ in successors[node]:
+            if succ in blocked_nodes or (node, succ) in blocked_links:
+                continue
+            nd = d + cost[succ]
+            if nd < dist.get(succ, np.inf):
+                dist[succ] = nd
+                previous[succ] = node
+                heapq.heappush(heap, (nd, succ))
+    return None, np.inf
+
+
+def k_shortest_paths(successors, cost, source, target, k):
+    # Yen's algorithm, loopless by construction
+    path, path_cost = shortest_path(successors, cost, source, target)
+    if path is None:
+        return []
+    found = [path]
+    candidates = []
+    seen = {tuple(path)}
+    while len(found) < k:
+        last = found[-1]
+        for i in range(len(last) - 1):
+            root = last[:i + 1]
+            blocked_links = {(p[i], p[i + 1]) for p in found if len(p) > i + 1 and p[:i + 1] == root}
+            spur, _ = shortest_path(successors, cost, last[i], target, set(root[:-1]), blocked_links)
+            if spur is None:
+                continue
+            candidate = root[:-1] + spur
+            if tuple(candidate) not in seen:
+                seen.add(tuple(candidate))
+                heapq.heappush(candidates, (float(cost[candidate].sum()), candidate))
+        if not candidates:
+            break
+        found.append(heapq.heappop(candidates)[1])
+    return found
+
+
+def precompute_route_table(net_file, trips_file, output_dir, k=5, min_count=1, max_pairs=DEFAULT_MAX_PAIRS):
+    import sumolib
+
+    net = sumolib.net.readNet(net_file)
+    edge_ids, index, successors, lengths, speeds = build_graph(net)
+    cost = lengths / speeds
+
+    pairs, pair_offsets, route_offsets, route_edges = [], [0], [0], []
+    for origin, destination in read_od_pairs(trips_file, min_count, max_pairs):
+        if origin not in index or destination not in index:
+            continue
+        paths = k_shortest_paths(successors, cost, index[origin], index[destination], k)
+        if not paths:
+            continue
+        pairs.append((index[origin], index[destination]))
+        for path in paths:
+            route_edges.extend(path)
+            route_offsets.append(len(route_edges))
+        pair_offsets.append(len(route_offsets) - 1)
+
+    os.makedirs(output_dir, exist_ok=True)
+    np.save(os.path.join(output_dir, "edge_ids.npy"), np.array(edge_ids))
+    np.save(os.path.join(output_dir, "edge_lengths.npy"), lengths.astype(np.float32))
+    np.save(os.path.join(output_dir, "edge_speeds.npy"), speeds.astype(np.float32))
+    np.save(os.path.join(output_dir, "pairs.npy"), np.array(pairs, dtype=np.int32).reshape(-1, 2))
+    np.save(os.path.join(output_dir, "pair_offsets.npy"), np.array(pair_offsets, dtype=np.int64))
+    np.save(os.path.join(output_dir, "route_offsets.npy"), np.array(route_offsets, dtype=np.int64))
+    np.save(os.path.join(output_dir, "route_edges.npy"), np.array(route_edges, dtype=np.int32))
+    print(f"Stored {len(route_offsets) - 1} routes for {len(pairs)} OD pairs in {output_dir}")
+
+
+class RouteTable:
+    """Memory-mapped k-shortest route table for runtime rerouting.
+
+    best_route(current_edge, destination, current_route) considers every
+    stored route to the destination that passes current_edge and returns the
+    suffix from there with the lowest cost under the current edge speeds,
+    skipping current_route (the vehicle's remaining route), or None.
+    """
+
+    def __init__(self, table_dir, congestion):
+        def load(name):
+            return np.load(os.path.join(table_dir, name), mmap_mode="r")
+
+        self.edge_ids = load("edge_ids.npy")
+        self.lengths = np.asarray(load("edge_lengths.npy"), dtype=float)
+        self.free_speeds = np.asarray(load("edge_speeds.npy"), dtype=float)
+        self.route_offsets = load("route_offsets.npy")
+        self.route_edges = load("route_edges.npy")
+        pairs = load("pairs.npy")
+        pair_offsets = load("pair_offsets.npy")
+
+        self.index = {str(edge_id): i for i, edge_id in enumerate(self.edge_ids)}
+        self.by_destination = {}
+        for p, (_, destination) in enumerate(pairs):
+            self.by_destination.setdefault(int(destination), []).extend(range(pair_offsets[p], pair_offsets[p + 1]))
+
+        self.congestion = congestion
+        self.congestion_index = np.array([congestion.index.get(str(edge_id), -1) for edge_id in self.edge_ids])
+        self.costs = None
+        self.costs_time = None
+        self.destination_edges = {}
+
+    def edge_costs(self):
+        # Current travel time per table edge, recomputed once per congestion update
+        if self.costs is None or self.costs_time != self.congestion.time:
+            known = self.congestion_index >= 0
+            speed = self.free_speeds.copy()
+            speed[known] = self.congestion.speed[self.congestion_index[known]]
+            self.costs = self.lengths / np.maximum(speed, MIN_SPEED)
+            self.costs_time = self.congestion.time
+        return self.costs
+
+    def _routes_to(self, destination):
+        # All stored routes to a destination as one edge array plus route offsets
+        group = self.destination_edges.get(destination)
+        if group is None:
+            routes = self.by_destination[destination]
+            edges = np.concatenate([self.route_edges[self.route_offsets[r]:self.route_offsets[r + 1]] for r in routes])
+            lengths = [self.route_offsets[r + 1] - self.route_offsets[r] for r in routes]
+            group = self.destination_edges[destination] = (edges, np.concatenate(([0], np.cumsum(lengths))))
+        return group
+
+    def best_route(self, current_edge, destination, current_route=None):
+        current = self.index.get(current_edge)
+        destination = self.index.get(destination, -1)
+        if current is None or destination not in self.by_destination:
+            return None
+
+        edges, offsets = self._routes_to(destination)
+        # Routes are loopless, so current_edge occurs at most once per route
+        starts = np.flatnonzero(edges == current)
+        if not len(starts):
+            return None
+        ends = offsets[np.searchsorted(offsets, starts, side="right")]
+        bounds = np.empty(2 * len(starts), dtype=np.int64)
+        bounds[0::2] = starts
+        bounds[1::2] = ends
+        # Suffix cost per route; the appended 0 keeps the last end a valid reduceat index
+        suffix_costs = np.add.reduceat(np.append(self.edge_costs()[edges], 0.0), bounds)[0::2]
+
+        if current_route is not None:
+            current_route = [self.index.get(edge_id, -1) for edge_id in current_route]
+        for i in np.argsort(suffix_costs, kind="stable"):
+            suffix = edges[starts[i]:ends[i]]
+            if current_route is None or not np.array_equal(suffix, current_route):
+                return [str(self.edge_ids[e]) for e in suffix]
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Precompute k-shortest alternative routes")
+    parser.add_argument("net_file")
+    parser.add_argument("trips_file")
+    parser.add_argument("output_dir")
+    parser.add_argument("-k", type=int, default=5, help="alternatives per OD pair")
+    parser.add_argument("--min-count", type=int, default=1, help="minimum trips ending at the destination")
+    parser.add_argument("--max-pairs", type=int, default=DEFAULT_MAX_PAIRS,
+                        help="OD pairs to compute, those with the most-used destinations first")
+    args = parser.parse_args()
+    precompute_route_table(args.net_file, args.trips_file, args.output_dir, args.k, args.min_count, args.max_pairs)
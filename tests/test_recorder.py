@@ -0,0 +1,74 @@
+import pytest
+
+pytest.importorskip("traci")
+
+import recorder
+
+
+def test_actuation_log_round_trip(tmp_path):
+    log_file = tmp_path / "run.actl"
+    rec = recorder.ActuationRecorder(str(log_file))
+    rec.time = 10.0  # skip the getTime() call, no SUMO connection in tests
+    rec.set_phase("tl1", 2)
+    rec.set_phase_duration("tl1", 7.5)
+    rec.set_route("veh0", ["a", "b#1", "c"])
+    rec.time = 20.0
+    rec.set_parameter("lane", "e_0", "stopOffset", "-0.5")
+    rec.set_route("veh1", ["b#1", "c"])
+    rec.close()
+
+    actuations, live_timing = recorder.read_actuations(str(log_file))
+    assert actuations == [
+        (10.0, recorder.OP_SET_PHASE, ("tl1", 2)),
+        (10.0, recorder.OP_SET_PHASE_DURATION, ("tl1", 7.5)),
+        (10.0, recorder.OP_SET_ROUTE, ("veh0", ["a", "b#1", "c"])),
+        (20.0, recorder.OP_SET_PARAMETER, ("lane", "e_0", "stopOffset", "-0.5")),
+        (20.0, recorder.OP_SET_ROUTE, ("veh1", ["b#1", "c"])),
+    ]
+    assert live_timing is not None
+
+
+def test_unclosed_log_has_no_timing(tmp_path):
+    log_file = tmp_path / "run.actl"
+    rec = recorder.ActuationRecorder(str(log_file))
+    rec.time = 1.0
+    rec.set_phase("tl1", 0)
+    rec.file.flush()
+
+    actuations, live_timing = recorder.read_actuations(str(log_file))
+    assert actuations == [(1.0, recorder.OP_SET_PHASE, ("tl1", 0))]
+    assert live_timing is None
+    rec.file.close()
+
+
+def test_rejects_other_files(tmp_path):
+    other = tmp_path / "other.bin"
+    other.write_bytes(b"NOPE\x01")
+    with pytest.raises(ValueError):
+        recorder.read_actuations(str(other))
+
+
+def test_resume_drops_actuations_after_checkpoint(tmp_path):
+    log_file = tmp_path / "run.actl"
+    rec = recorder.ActuationRecorder(str(log_file))
+    rec.time = 10.0
+    rec.set_phase("tl1", 1)
+    checkpoint = rec.state(10.0)
+    rec.time = 20.0
+    rec.set_route("veh0", ["a", "b"])
+    rec.file.write(b"\x01\x00")  # record cut off by the crash
+    rec.file.close()
+
+    resumed = recorder.ActuationRecorder(str(log_file), resume=checkpoint)
+    resumed.time = 20.0
+    resumed.set_route("veh0", ["a", "c"])
+    resumed.set_phase("tl1", 2)
+    resumed.close()
+
+    actuations, live_timing = recorder.read_actuations(str(log_file))
+    assert actuations == [
+        (10.0, recorder.OP_SET_PHASE, ("tl1", 1)),
+        (20.0, recorder.OP_SET_ROUTE, ("veh0", ["a", "c"])),
+        (20.0, recorder.OP_SET_PHASE, ("tl1", 2)),
+    ]
+    assert live_timing is not None
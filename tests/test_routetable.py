@@ -0,0 +1,79 @@
+import os
+import random
+
+import numpy as np
+
+import routetable
+
+
+def all_simple_paths(successors, source, target):
+    paths = []
+
+    def visit(path):
+        if path[-1] == target:
+            paths.append(list(path))
+            return
+        for succ in successors[path[-1]]:
+            if succ not in path:
+                visit(path + [succ])
+
+    visit([source])
+    return paths
+
+
+def random_graph(rng, n, p):
+    return [[j for j in range(n) if j != i and rng.random() < p] for i in range(n)]
+
+
+def test_k_shortest_paths_matches_brute_force():
+    rng = random.Random(7)
+    for _ in range(50):
+        n = rng.randint(3, 8)
+        successors = random_graph(rng, n, 0.4)
+        cost = np.array([rng.uniform(1, 10) for _ in range(n)])
+        source, target = rng.sample(range(n), 2)
+        k = rng.randint(1, 6)
+
+        expected = sorted(cost[path].sum() for path in all_simple_paths(successors, source, target))[:k]
+        found = routetable.k_shortest_paths(successors, cost, source, target, k)
+
+        assert len({tuple(path) for path in found}) == len(found)
+        for path in found:
+            assert path[0] == source and path[-1] == target
+            assert len(set(path)) == len(path)
+            assert all(b in successors[a] for a, b in zip(path, path[1:]))
+        assert np.allclose([cost[path].sum() for path in found], expected)
+
+
+class Congestion:
+    def __init__(self, edge_ids, speed):
+        self.index = {edge_id: i for i, edge_id in enumerate(edge_ids)}
+        self.speed = np.asarray(speed, dtype=float)
+        self.time = 0.0
+
+
+def write_table(table_dir, edge_ids, routes):
+    # routes: edge index lists, all from edge 0 to the last edge
+    os.makedirs(table_dir, exist_ok=True)
+    route_edges = [e for route in routes for e in route]
+    np.save(os.path.join(table_dir, "edge_ids.npy"), np.array(edge_ids))
+    np.save(os.path.join(table_dir, "edge_lengths.npy"), np.full(len(edge_ids), 100, dtype=np.float32))
+    np.save(os.path.join(table_dir, "edge_speeds.npy"), np.full(len(edge_ids), 10, dtype=np.float32))
+    np.save(os.path.join(table_dir, "pairs.npy"), np.array([[0, len(edge_ids) - 1]], dtype=np.int32))
+    np.save(os.path.join(table_dir, "pair_offsets.npy"), np.array([0, len(routes)], dtype=np.int64))
+    np.save(os.path.join(table_dir, "route_offsets.npy"),
+            np.concatenate(([0], np.cumsum([len(route) for route in routes]))).astype(np.int64))
+    np.save(os.path.join(table_dir, "route_edges.npy"), np.array(route_edges, dtype=np.int32))
+
+
+def test_best_route_picks_cheapest_suffix_other_than_current(tmp_path):
+    edge_ids = ["o", "a", "b", "c", "d"]
+    write_table(str(tmp_path), edge_ids, [[0, 1, 4], [0, 2, 4], [0, 2, 3, 4]])
+    # "a" is jammed, so the suffixes through "b" are cheaper
+    table = routetable.RouteTable(str(tmp_path), Congestion(edge_ids, [10, 1, 10, 10, 10]))
+
+    assert table.best_route("o", "d") == ["o", "b", "d"]
+    assert table.best_route("o", "d", ["o", "b", "d"]) == ["o", "b", "c", "d"]
+    assert table.best_route("b", "d", ("b", "d")) == ["b", "c", "d"]
+    assert table.best_route("c", "d", ["c", "d"]) is None
+    assert table.best_route("x", "d") is None
@@ -0,0 +1,152 @@
+import glob
+import os
+import zlib
+
+import numpy as np
+import traci
+import traci.constants as tc
+
+VEHICLE_VARIABLES = (tc.VAR_POSITION, tc.VAR_SPEED, tc.VAR_CO2EMISSION, tc.VAR_ROAD_ID)
+COLUMNS = ('time', 'vehicle', 'x', 'y', 'speed', 'co2', 'edge')
+
+
+class TrajectoryCapture:
+    """Sampled replacement for SUMO's --fcd-output / --emission-output.
+
+    Must be created after traci.start() and step() called once per simulation
+    step. Every `period` seconds the position, speed, CO2 (mg/s) and edge of the
+    sampled vehicles are appended to an in-memory buffer, which is written as a
+    compressed columnar .npz chunk every `flush_interval` simulated seconds or
+    `chunk_rows` rows, whichever comes first. Chunks left in output_dir by an
+    earlier run are removed so load_trajectories only sees this run; a run
+    resumed from a checkpoint passes the `chunks` count saved with it as
+    first_chunk to keep the chunks written up to the checkpoint.
+
+    bbox = (xmin, ymin, xmax, ymax) and edges = set of edge ids restrict
+    capture spatially; vehicle_fraction keeps a stable hash-based subset of
+    vehicles so the same vehicles are followed for the whole run.
+    """
+
+    def __init__(self, output_dir, period=1.0, bbox=None, edges=None, vehicle_fraction=1.0, chunk_rows=200000,
+                 flush_interval=300.0, first_chunk=0):
+        os.makedirs(output_dir, exist_ok=True)
+        for stale in glob.glob(os.path.join(output_dir, "chunk_*.npz")):
+            if int(os.path.basename(stale)[6:-4]) >= first_chunk:
+                os.remove(stale)
+        self.output_dir = output_dir
+        self.period = period
+        self.bbox = bbox
+        self.edges = set(edges) if edges else None
+        self.vehicle_fraction = vehicle_fraction
+        self.chunk_rows = chunk_rows
+        self.flush_interval = flush_interval
+
+        self.subscribed = set()
+        self.vehicle_codes = {}
+        self.edge_codes = {}
+        self.buffer = {column: [] for column in COLUMNS}
+        self.buffered_rows = 0
+        self.chunks = first_chunk
+        self.next_sample = None
+        self.next_flush = None
+
+        # Departures arrive with the regular step results, no extra TraCI call
+        traci.simulation.subscribe([tc.VAR_DEPARTED_VEHICLES_IDS])
+        for veh_id in traci.vehicle.getIDList():
+            self._subscribe(veh_id)
+
+    def _sampled(self, veh_id):
+        if self.vehicle_fraction >= 1:
+            return True
+        return zlib.crc32(veh_id.encode('utf-8')) % 10000 < self.vehicle_fraction * 10000
+
+    def _subscribe(self, veh_id):
+        if self._sampled(veh_id):
+            traci.vehicle.subscribe(veh_id, VEHICLE_VARIABLES)
+            self.subscribed.add(veh_id)
+
+    def _code(self, codes, value):
+        code = codes.get(value)
+        if code is None:
+            code = codes[value] = len(codes)
+        return code
+
+    def step(self, sim_time):
+        departed = traci.simulation.getSubscriptionResults().get(tc.VAR_DEPARTED_VEHICLES_IDS, ())
+        for veh_id in departed:
+            self._subscribe(veh_id)
+
+        if self.next_sample is not None and sim_time < self.next_sample:
+            return
+        self.next_sample = sim_time + self.period
+
+        results = traci.vehicle.getAllSubscriptionResults()
+        ids = [veh_id for veh_id in results if veh_id in self.subscribed and tc.VAR_POSITION in results[veh_id]]
+        if not ids:
+            return
+
+        position = np.array([results[veh_id][tc.VAR_POSITION] for veh_id in ids], dtype=np.float32)
+        roads = [results[veh_id][tc.VAR_ROAD_ID] for veh_id in ids]
+        mask = np.ones(len(ids), dtype=bool)
+        if self.bbox is not None:
+            xmin, ymin, xmax, ymax = self.bbox
+            mask &= ((position[:, 0] >= xmin) & (position[:, 0] <= xmax) &
+                     (position[:, 1] >= ymin) & (position[:, 1] <= ymax))
+        if self.edges is not None:
+            mask &= np.fromiter((road in self.edges for road in roads), dtype=bool, count=len(roads))
+        selected = np.flatnonzero(mask)
+        if len(selected) == 0:
+            return
+
+        self.buffer['time'].append(np.full(len(selected), sim_time, dtype=np.float32))
+        self.buffer['vehicle'].append(np.array([self._code(self.vehicle_codes, ids[i]) for i in selected], dtype=np.int32))
+        self.buffer['x'].append(position[selected, 0])
+        self.buffer['y'].append(position[selected, 1])
+        self.buffer['speed'].append(np.array([results[ids[i]][tc.VAR_SPEED] for i in selected], dtype=np.float32))
+        self.buffer['co2'].append(np.array([results[ids[i]][tc.VAR_CO2EMISSION] for i in selected], dtype=np.float32))
+        self.buffer['edge'].append(np.array([self._code(self.edge_codes, roads[i]) for i in selected], dtype=np.int32))
+        self.buffered_rows += len(selected)
+
+        if self.next_flush is None:
+            self.next_flush = sim_time + self.flush_interval
+        if self.buffered_rows >= self.chunk_rows or sim_time >= self.next_flush:
+            self.flush()
+            self.next_flush = sim_time + self.flush_interval
+
+    def flush(self):
+        if not self.buffered_rows:
+            return
+        columns = {column: np.concatenate(parts) for column, parts in self.buffer.items()}
+        # Each chunk carries the id tables so it can be read on its own
+        np.savez_compressed(os.path.join(self.output_dir, f"chunk_{self.chunks:05d}.npz"),
+                            vehicle_ids=np.array(list(self.vehicle_codes)),
+                            edge_ids=np.array(list(self.edge_codes)),
+                            **columns)
+        self.chunks += 1
+        self.buffer = {column: [] for column in COLUMNS}
+        self.buffered_rows = 0
+
+    def close(self):
+        self.flush()
+        print(f"Trajectory capture wrote {self.chunks} chunks to {self.output_dir}")
+
+
+def load_trajectories(output_dir):
+    """Reads all chunks of a capture into one DataFrame (fcd-like columns)."""
+    import pandas as pd
+
+    frames = []
+    for path in sorted(glob.glob(os.path.join(output_dir, "chunk_*.npz"))):
+        with np.load(path) as chunk:
+            frames.append(pd.DataFrame({
+                'time': chunk['time'],
+                'id': chunk['vehicle_ids'][chunk['vehicle']],
+                'x': chunk['x'],
+                'y': chunk['y'],
+                'speed': chunk['speed'],
+                'CO2': chunk['co2'],
+                'edge': chunk['edge_ids'][chunk['edge']],
+            }))
+    if not frames:
+        return pd.DataFrame(columns=['time', 'id', 'x', 'y', 'speed', 'CO2', 'edge'])
+    return pd.concat(frames, ignore_index=True)